@@ -0,0 +1,58 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+
+class ChunkStore:
+    """SQLite store of chunk text keyed by vector ID, so Pinecone metadata stays small.
+
+    Recently read chunks are kept in an in-memory LRU, since popular passages
+    come back across many queries.
+    """
+
+    # Stay well below SQLite's bound-parameter limit
+    _SELECT_BATCH = 500
+
+    def __init__(self, path: str, hot_size: int = 1024):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS chunks (vector_id TEXT PRIMARY KEY, content TEXT NOT NULL)")
+        self._hot: "OrderedDict[str, str]" = OrderedDict()
+        self._hot_size = hot_size
+
+    def put_many(self, items: Sequence[Tuple[str, str]]):
+        """Store (vector_id, content) pairs, replacing earlier versions"""
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO chunks (vector_id, content) VALUES (?, ?)", items)
+            for vector_id, _ in items:
+                self._hot.pop(vector_id, None)
+
+    def delete_many(self, vector_ids: Sequence[str]):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM chunks WHERE vector_id = ?", [(vector_id,) for vector_id in vector_ids])
+            for vector_id in vector_ids:
+                self._hot.pop(vector_id, None)
+
+    def get_many(self, vector_ids: List[str]) -> Dict[str, str]:
+        """Content for each known vector ID; unknown IDs are left out"""
+        with self._lock:
+            found = {vector_id: self._hot[vector_id] for vector_id in vector_ids if vector_id in self._hot}
+            missing = [vector_id for vector_id in vector_ids if vector_id not in found]
+            for i in range(0, len(missing), self._SELECT_BATCH):
+                batch = missing[i:i + self._SELECT_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                found.update(self._conn.execute(
+                    f"SELECT vector_id, content FROM chunks WHERE vector_id IN ({placeholders})", batch
+                ).fetchall())
+
+            for vector_id in vector_ids:
+                if vector_id in found:
+                    self._hot[vector_id] = found[vector_id]
+                    self._hot.move_to_end(vector_id)
+            while len(self._hot) > self._hot_size:
+                self._hot.popitem(last=False)
+        return found
@@ -1,20 +1,63 @@
-import fitz
-from docx import Document
 from pathlib import Path
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-import pandas as pd
-from bs4 import BeautifulSoup
+import os
+import hashlib
+import json
+import csv
 import re
-from typing import List, Dict, Any
+import mmap
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+
+
+# Single-pass equivalent of collapsing 3+ newlines, runs of spaces/tabs and
+# leading spaces after a newline
+_RE_CLEAN = re.compile(r'(\n\s*\n\s*\n[ \t]*)|(\n[ \t]+)|([ \t]+)')
+
+
+def _clean_repl(match: re.Match) -> str:
+    if match.group(1):
+        return '\n\n'
+    if match.group(2):
+        return '\n'
+    return ' '
+
+
+# Part of every process_document cache key; bump it whenever extraction, cleaning
+# or splitting changes so cached chunks from older code are not served
+_CACHE_VERSION = 1
+
+
+# A newline directly followed by visible text. _RE_CLEAN only rewrites whitespace
+# runs, so text cut there cleans the same in pieces as in one go
+_RE_LINE_START = re.compile(r'\n(?=\S)')
+
+
+# Preferred chunk boundaries for the simple splitter
+_RE_SPLIT = re.compile(r'\n\n|\n|\. |! |\? ')
+
+
+class EmptyDocumentError(ValueError):
+    """Raised when a document yields no text to chunk"""
 
 
 class DocumentProcessor:
-    def __init__(self, chunk_size=800, overlap=150):
-        self.splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=overlap,
-            separators=["\n\n", "\n", ". ", "• ", "- ", " "]
-        )
+    def __init__(self, chunk_size: int = 800, overlap: int = 150, use_langchain: bool = True,
+                 cache_dir: Optional[str] = None):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.use_langchain = use_langchain
+        # Optional on-disk cache of process_document results, keyed by file content
+        self.cache_dir = cache_dir
+        self.splitter = None
+        if use_langchain:
+            # Heavy optional imports are deferred until a code path needs them
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            self.splitter = RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size,
+                chunk_overlap=overlap,
+                separators=["\n\n", "\n", ". ", "• ", "- ", " "]
+            )
 
     def extract_text(self, file_path: str) -> str:
         file_type = Path(file_path).suffix.lower()
@@ -24,67 +67,144 @@ class DocumentProcessor:
         elif file_type == ".docx":
             return self._extract_docx_text(file_path)
         elif file_type == ".txt":
-            with open(file_path, "r", encoding="utf-8") as f:
-                return f.read().strip()
+            return self._read_text_file(file_path)
         elif file_type == ".csv":
-            df = pd.read_csv(file_path)
-            return df.to_string(index=False)
+            return self._extract_csv_text(file_path)
         elif file_type == ".html":
+            from bs4 import BeautifulSoup
             with open(file_path, "r", encoding="utf-8") as f:
-                soup = BeautifulSoup(f, "html.parser")
+                soup = BeautifulSoup(f, "lxml")
                 return soup.get_text(separator="\n", strip=True)
         
         raise ValueError(f"Unsupported file type: {file_type}")
 
-    def _extract_pdf_text(self, file_path: str) -> str:
+    def _read_text_file(self, file_path: str) -> str:
+        """Read a UTF-8 text file through a read-only memory map"""
+        with open(file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return ""
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                text = str(mm, "utf-8")
+                has_cr = mm.find(b"\r") != -1
+        if has_cr:
+            # Match the universal newline handling of text-mode open()
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text.strip()
+
+    def _extract_csv_text(self, file_path: str) -> str:
+        """Render CSV rows as space-separated lines without loading a DataFrame"""
+        with open(file_path, "r", encoding="utf-8", newline="") as f:
+            return "\n".join(" ".join(row) for row in csv.reader(f)).strip()
+
+    def _iter_pdf_pages(self, file_path: str) -> Iterator[str]:
+        """Yield raw PDF text one page at a time, keeping the document open only while iterating"""
+        import fitz
         doc = fitz.open(file_path)
-        text = ""
-        for page_num, page in enumerate(doc):
-            text += f"\n--- Page {page_num + 1} ---\n"
-            text += page.get_text() + "\n"
-        doc.close()
-        return self._clean_text(text)
+        try:
+            for page_num, page in enumerate(doc):
+                yield f"\n--- Page {page_num + 1} ---\n{page.get_text('text')}\n"
+        finally:
+            doc.close()
+
+    def _extract_pdf_text(self, file_path: str) -> str:
+        return self._clean_text("".join(self._iter_pdf_pages(file_path)))
+
+    def _iter_clean_pdf_text(self, file_path: str) -> Iterator[str]:
+        """Yield the cleaned text of _extract_pdf_text in pieces that end on line boundaries.
+
+        Each page is cut after its last newline followed by visible text and the
+        remainder is carried into the next page, so whitespace spanning a page break
+        (including the page separator) is cleaned exactly as in the joined document.
+        """
+        pending = ""
+        at_start = True
+        for page in self._iter_pdf_pages(file_path):
+            pending += page
+            cut = None
+            for match in _RE_LINE_START.finditer(pending):
+                cut = match.end()
+            if cut is None:
+                continue
+            piece = _RE_CLEAN.sub(_clean_repl, pending[:cut])
+            pending = pending[cut:]
+            if at_start:
+                # Leading whitespace of the whole document is stripped
+                piece = piece.lstrip()
+                at_start = not piece
+            yield piece
+        tail = self._clean_text(pending) if at_start else _RE_CLEAN.sub(_clean_repl, pending).rstrip()
+        yield tail
 
     def _extract_docx_text(self, file_path: str) -> str:
+        from docx import Document
         doc = Document(file_path)
-        text_parts = [para.text.strip() for para in doc.paragraphs if para.text.strip()]
-        return self._clean_text("\n\n".join(text_parts))
+        return self._clean_text("\n\n".join(text for para in doc.paragraphs if (text := para.text.strip())))
 
     def _clean_text(self, text: str) -> str:
-        text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)
-        text = re.sub(r'[ \t]+', ' ', text)
-        text = re.sub(r'\n ', '\n', text)
-        return text.strip()
+        return _RE_CLEAN.sub(_clean_repl, text).strip()
+
+    def _simple_text_splitter(self, text: str) -> List[str]:
+        """Split text into overlapping chunks, preferring sentence/line boundaries"""
+        chunks: List[str] = []
+        start = 0
+        length = len(text)
+        half = self.chunk_size // 2
+
+        while start < length:
+            end = min(start + self.chunk_size, length)
+            if end < length:
+                # Rightmost boundary in the second half of the window, in one scan
+                best = None
+                for match in _RE_SPLIT.finditer(text, start + half, end):
+                    best = match
+                if best:
+                    end = best.end()
+
+            chunk = text[start:end].strip()
+            if chunk:
+                chunks.append(chunk)
+            if end >= length:
+                break
+            start = max(end - self.overlap, start + 1)
+
+        return chunks
 
-    def _group_by_headings(self, text: str) -> List[Dict[str, str]]:
-        """Group text into sections based on heading heuristics"""
-        lines = text.splitlines()
-        blocks = []
-        current_heading = "Introduction"
-        current_body = []
+    def _split_body(self, body: str) -> List[str]:
+        if self.use_langchain:
+            return self.splitter.split_text(body)
+        return self._simple_text_splitter(body)
 
-        for line in lines:
+    def _iter_blocks(self, segments: Iterable[str]) -> Iterator[Dict[str, str]]:
+        """Group a stream of text segments (e.g. pages) into heading sections.
+
+        The current heading carries across segment boundaries, so only the
+        section being built is held in memory.
+        """
+        current_heading: str = "Introduction"
+        current_body: List[str] = []
+
+        for line in (line for segment in segments for line in segment.splitlines()):
             stripped = line.strip()
             if not stripped:
                 continue
 
-            # Heading heuristics
+            # Heading heuristics, cheapest checks first
             is_heading = (
                 len(stripped) < 60 and
                 (
+                    (not stripped.endswith('.') and len(stripped.split(None, 5)) <= 5) or  # short + not sentence
                     stripped.isupper() or  # ALL CAPS
-                    stripped.istitle() or  # Title Case
-                    (len(stripped.split()) <= 5 and not stripped.endswith('.'))  # short + not sentence
+                    stripped.istitle()  # Title Case
                 )
             )
 
             if is_heading:
                 # Save previous block
                 if current_body:
-                    blocks.append({
+                    yield {
                         "heading": current_heading,
                         "body": "\n".join(current_body).strip()
-                    })
+                    }
                     current_body = []
                 current_heading = stripped
             else:
@@ -92,57 +212,124 @@ class DocumentProcessor:
 
         # Final block
         if current_body:
-            blocks.append({
+            yield {
                 "heading": current_heading,
                 "body": "\n".join(current_body).strip()
-            })
-
-        return blocks
+            }
 
     def split_text(self, text: str, filename: str) -> List[Dict[str, Any]]:
         """Split text while preserving heading context"""
-        chunks = []
-        blocks = self._group_by_headings(text)
+        return list(self._iter_chunks(self._iter_blocks([text]), filename))
 
+    def _iter_chunks(self, blocks: Iterable[Dict[str, str]], filename: str) -> Iterator[Dict[str, Any]]:
         for block_index, block in enumerate(blocks):
             heading = block["heading"]
             body = block["body"]
+            prefix = "[" + heading + "]\n"
+            base_meta = {
+                "filename": filename,
+                "heading": heading,
+                "block_index": block_index,
+                "document_type": "structured",
+            }
 
-            if len(body) <= self.splitter._chunk_size:
-                chunks.append({
-                    "content": f"[{heading}]\n{body}",
+            body_chunks = [body] if len(body) <= self.chunk_size else self._split_body(body)
+            for i, chunk in enumerate(body_chunks):
+                yield {
+                    "content": prefix + chunk,
                     "metadata": {
-                        "filename": filename,
-                        "heading": heading,
-                        "chunk_index": 0,
-                        "block_index": block_index,
-                        "document_type": "structured",
-                        "char_count": len(body)
+                        **base_meta,
+                        "chunk_index": i,
+                        "char_count": len(chunk)
                     }
-                })
-            else:
-                body_chunks = self.splitter.split_text(body)
-                for i, chunk in enumerate(body_chunks):
-                    chunks.append({
-                        "content": f"[{heading}]\n{chunk}",
-                        "metadata": {
-                            "filename": filename,
-                            "heading": heading,
-                            "chunk_index": i,
-                            "block_index": block_index,
-                            "document_type": "structured",
-                            "char_count": len(chunk)
-                        }
-                    })
+                }
 
-        return chunks
+    def iter_document(self, file_path: str, filename: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield chunks for a document; PDFs are streamed page by page.
 
-    def process_document(self, file_path: str) -> List[Dict[str, Any]]:
-        filename = Path(file_path).name
+        filename is recorded in chunk metadata and defaults to the file's own name.
+        """
+        filename = filename or Path(file_path).name
+        yield from self._iter_chunks(self._iter_blocks(self._iter_segments(file_path)), filename)
+
+    def _iter_segments(self, file_path: str) -> Iterable[str]:
+        """Cleaned document text, one page at a time for PDFs and in one piece otherwise"""
+        if Path(file_path).suffix.lower() == ".pdf":
+            return self._iter_clean_pdf_text(file_path)
+        return [self.extract_text(file_path)]
+
+    def _cache_path(self, file_path: str, filename: str, min_chars: int) -> str:
+        """Cache file for a document's content, name, chunking settings and processing code version"""
+        digest = hashlib.sha256(f"v{_CACHE_VERSION}".encode())
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        # Chunk metadata carries the filename, so it is part of the key
+        digest.update(filename.encode())
+        settings = f"{self.chunk_size}-{self.overlap}-{int(self.use_langchain)}-{min_chars}"
+        return os.path.join(self.cache_dir, f"{digest.hexdigest()}-{settings}.json")
+
+    def _read_cache(self, cache_path: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # Corrupt entry; it is rewritten below
+            return None
+
+    def _write_cache(self, cache_path: str, chunks: List[Dict[str, Any]]):
+        """Best-effort atomic write; a failed write only costs a cache miss later"""
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(chunks, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except (OSError, TypeError, ValueError):
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def process_document(self, file_path: str, filename: Optional[str] = None,
+                         min_chars: int = 0) -> List[Dict[str, Any]]:
+        """Chunk a document; raises EmptyDocumentError if it has fewer than min_chars of text or yields no chunks"""
+        filename = filename or Path(file_path).name
         try:
-            text = self.extract_text(file_path)
-            if not text.strip():
-                raise ValueError("No text content extracted")
-            return self.split_text(text, filename)
+            cache_path = self._cache_path(file_path, filename, min_chars) if self.cache_dir else None
+            if cache_path and (cached := self._read_cache(cache_path)) is not None:
+                return cached
+
+            text_chars = 0
+
+            def counted(segments: Iterable[str]) -> Iterator[str]:
+                nonlocal text_chars
+                for segment in segments:
+                    text_chars += len(segment.strip())
+                    yield segment
+
+            chunks = list(self._iter_chunks(self._iter_blocks(counted(self._iter_segments(file_path))), filename))
+            if text_chars < min_chars:
+                raise EmptyDocumentError("Document has too little text")
+            if not chunks:
+                raise EmptyDocumentError("No text content extracted")
+
+            if cache_path:
+                self._write_cache(cache_path, chunks)
+            return chunks
+        except EmptyDocumentError:
+            raise
         except Exception as e:
             raise Exception(f"Error processing {filename}: {str(e)}")
+
+    def process_documents(self, file_paths: Iterable[str], max_workers: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Process several documents in parallel, keyed by file path"""
+        results = {}
+        # Callers may already hold threads and open connections; forking them can deadlock
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {executor.submit(self.process_document, path): path for path in file_paths}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        return results
@@ -1,30 +1,302 @@
-from sentence_transformers import SentenceTransformer
+import os
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import functools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Literal, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _configure_torch_threads():
+    """Pin torch's CPU thread pools; intra-op is overridable via EMBEDDING_INTRAOP_THREADS"""
+    import torch
+    torch.set_num_threads(int(os.getenv("EMBEDDING_INTRAOP_THREADS", min(8, os.cpu_count() or 1))))
+    try:
+        # A single inter-op thread avoids contention with FastAPI's worker threads
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Can only be set once, before any parallel work has started
+        pass
+
+
+def _text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+class _EmbeddingCache:
+    """SQLite store of float32 embeddings keyed by a hash of the source text"""
+
+    # Stay well below SQLite's bound-parameter limit
+    _SELECT_BATCH = 500
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), self._SELECT_BATCH):
+                batch = keys[i:i + self._SELECT_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+        return found
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, vector.tobytes()) for key, vector in zip(keys, vectors)]
+            )
+
+
+class _QueryBatcher:
+    """Coalesces concurrent query embeddings into a single encode call.
+
+    Queries that arrive while a batch is being encoded are picked up together
+    by the next batch, so there is no added latency when only one is in flight.
+    """
+
+    def __init__(self, encode, executor: ThreadPoolExecutor, max_batch: int = 32):
+        self._encode = encode
+        self._executor = executor
+        self._max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, text: str) -> np.ndarray:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def close(self):
+        """Stop the worker task, failing any queries still waiting in the queue"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Embeddings closed"))
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            while len(items) < self._max_batch and not self._queue.empty():
+                items.append(self._queue.get_nowait())
+
+            try:
+                vectors = await loop.run_in_executor(self._executor, self._encode, [text for text, _ in items])
+            except asyncio.CancelledError:
+                for _, future in items:
+                    future.cancel()
+                raise
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), vector in zip(items, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_model(model_name: str, backend: str, precision: str, compile_model: bool = False):
+    """Load a model once per process and share it between Embeddings instances"""
+    if backend == 'torch':
+        _configure_torch_threads()
+    from sentence_transformers import SentenceTransformer
+    # backend="onnx" runs the exported graph on ONNX Runtime (needs sentence-transformers[onnx])
+    model = SentenceTransformer(model_name, backend=backend)
+
+    # Reduced precision only applies to the torch backend
+    if backend == 'torch' and precision != 'fp32':
+        import torch
+        model = model.half() if precision == 'fp16' else model.to(torch.bfloat16)
+    model.eval()
+
+    if backend == 'torch' and compile_model:
+        _compile_transformer(model)
+    return model
+
+
+def _compile_transformer(model):
+    """torch.compile the underlying transformer, keeping eager mode if compilation fails"""
+    import torch
+    transformer = model[0]
+    eager = transformer.auto_model
+    transformer.auto_model = torch.compile(eager, dynamic=True)
+    try:
+        # Compilation is lazy; pay for it here rather than on the first request
+        with torch.inference_mode():
+            model.encode(["warmup"] * 8, show_progress_bar=False)
+    except Exception:
+        logger.warning("torch.compile failed; using eager mode", exc_info=True)
+        transformer.auto_model = eager
+
+
+@dataclass
+class EmbeddedBatch:
+    """Embedded chunks as parallel columns; row i of embeddings belongs to contents[i]"""
+    embeddings: np.ndarray
+    contents: List[str]
+    metadatas: List[Dict[str, Any]]
+
+    def __len__(self) -> int:
+        return len(self.contents)
 
 
 class Embeddings:
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', batch_size: int = 64, backend: str = 'torch',
+                 precision: Literal['fp32', 'fp16', 'bf16'] = 'fp32', cache_dir: Optional[str] = None,
+                 query_cache_size: int = 4096, compile_model: bool = False):
+        import torch
+        self.batch_size = batch_size
+        self.model = _load_model(model_name, backend, precision, compile_model)
+        self._inference_mode = torch.inference_mode
+        self._dim: int = self.model.get_sentence_embedding_dimension()
 
-    def embed_documents(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Persistent chunk embedding cache (opt-in) and in-memory LRU for queries
+        self._cache = None
+        if cache_dir:
+            # Backend and precision change the vectors, so each combination gets its own file
+            db_name = f"{model_name.replace('/', '__')}-{backend}-{precision}.db"
+            self._cache = _EmbeddingCache(os.path.join(cache_dir, db_name))
+        # Keyed by digest so long queries don't pin their text in memory
+        self._query_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._query_cache_size = query_cache_size
+        self._query_lock = threading.Lock()
+        # Every async encode runs on this one thread: the model already uses all of its
+        # intra-op threads, and the fast tokenizer can't be used from two threads at once
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self._query_batcher = _QueryBatcher(self._encode, self._executor)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        with self._inference_mode():
+            embeddings = self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+        return embeddings.astype(np.float32, copy=False)
+
+    def _encode_cached(self, texts: List[str]) -> np.ndarray:
+        """Encode texts, reading and filling the persistent cache"""
+        keys = [_text_key(text) for text in texts]
+        hits = self._cache.get_many(list(set(keys)))
+        misses = [i for i, key in enumerate(keys) if key not in hits]
+
+        embeddings = np.empty((len(texts), self._dim), dtype=np.float32)
+        if misses:
+            encoded = self._encode([texts[i] for i in misses])
+            embeddings[misses] = encoded
+            self._cache.put_many([keys[i] for i in misses], encoded)
+        for i, key in enumerate(keys):
+            if key in hits:
+                embeddings[i] = hits[key]
+        return embeddings
+
+    def embed_documents(self, documents: List[Dict[str, Any]]) -> EmbeddedBatch:
         """Embed document chunks"""
         texts = [doc["content"] for doc in documents]
-        embeddings = self.model.encode(texts, normalize_embeddings=True)
-        
-        return [
-            {
-                "embedding": embeddings[i],
-                "content": documents[i]["content"],
-                "metadata": documents[i]["metadata"]
-            }
-            for i in range(len(documents))
-        ]
+
+        # Encode each distinct text once (repeated headers/footers are common) and scatter back
+        unique: Dict[str, int] = {}
+        inverse = [unique.setdefault(text, len(unique)) for text in texts]
+        unique_texts = list(unique)
+        encoded = self._encode_cached(unique_texts) if self._cache is not None else self._encode(unique_texts)
+        embeddings = encoded if len(unique_texts) == len(texts) else encoded[inverse]
+        return EmbeddedBatch(embeddings, texts, [doc["metadata"] for doc in documents])
+
+    async def aembed_documents(self, documents: List[Dict[str, Any]]) -> EmbeddedBatch:
+        """Embed document chunks on the encoder thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.embed_documents, documents)
+
+    async def aclose(self):
+        """Stop the query batcher and the encoder thread"""
+        await self._query_batcher.close()
+        self._executor.shutdown(wait=False)
+
+    def _cached_query(self, query: str) -> Optional[np.ndarray]:
+        key = _text_key(query)
+        with self._query_lock:
+            cached = self._query_cache.get(key)
+            if cached is not None:
+                self._query_cache.move_to_end(key)
+            return cached
+
+    def _remember_query(self, query: str, embedding: np.ndarray) -> np.ndarray:
+        # Cached arrays are shared between callers
+        embedding.flags.writeable = False
+        with self._query_lock:
+            self._query_cache[_text_key(query)] = embedding
+            if len(self._query_cache) > self._query_cache_size:
+                self._query_cache.popitem(last=False)
+        return embedding
 
     def embed_query(self, query: str) -> np.ndarray:
         """Embed a query string"""
-        return self.model.encode(query, normalize_embeddings=True)
+        cached = self._cached_query(query)
+        if cached is not None:
+            return cached
+
+        with self._inference_mode():
+            embedding = self.model.encode(query, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
+        return self._remember_query(query, embedding.astype(np.float32, copy=False))
+
+    async def aembed_query(self, query: str) -> np.ndarray:
+        """Embed a query string, batching with other concurrent queries"""
+        cached = self._cached_query(query)
+        if cached is not None:
+            return cached
+
+        embedding = await self._query_batcher.submit(query)
+        return self._remember_query(query, embedding)
+
+    def query_cache_size(self) -> int:
+        """Number of query embeddings currently cached"""
+        with self._query_lock:
+            return len(self._query_cache)
+
+    def similarities(self, query: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+        """Cosine similarity of a query against every row of a matrix (embeddings are unit-normalized)"""
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        return matrix @ query.astype(np.float32, copy=False)
+
+    def similarity(self, a: np.ndarray, b: np.ndarray) -> float:
+        """Cosine similarity of two embeddings"""
+        return float(self.similarities(a, b[None])[0])
+
+    def warm_up(self):
+        """Run one encode so lazy initialisation isn't paid by the first request"""
+        self._encode(["warmup"])
 
     def dimension(self) -> int:
         """Get embedding dimension"""
-        return self.model.get_sentence_embedding_dimension()
+        return self._dim
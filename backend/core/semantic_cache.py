@@ -0,0 +1,121 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import numpy as np
+
+
+class QueryCache:
+    """Semantic LRU cache for query results.
+
+    A lookup hits when a stored query embedding has cosine similarity of at
+    least `threshold` with the new one (embeddings are unit-normalized). Stored
+    embeddings live in one preallocated matrix so a lookup is a single
+    matrix-vector product.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 300.0, max_size: int = 2000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        # Bumped to invalidate every entry at once (e.g. after new documents are indexed)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.RLock()
+        self._matrix: Optional[np.ndarray] = None
+        # slot -> (tag, payload, expires_at, generation), in LRU order
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._free = list(range(max_size))
+
+    def get(self, embedding: np.ndarray, tag: Hashable = None) -> Optional[Any]:
+        """Return the payload of the most similar live entry with the same tag, if any"""
+        with self._lock:
+            if self._entries:
+                sims = self._matrix @ embedding
+                candidates = np.flatnonzero(sims >= self.threshold)
+                now = time.monotonic()
+                for slot in candidates[np.argsort(sims[candidates])[::-1]]:
+                    slot = int(slot)
+                    entry = self._entries.get(slot)
+                    if entry is None or entry[0] != tag:
+                        continue
+                    _, payload, expires_at, generation = entry
+                    if expires_at < now or generation != self.generation:
+                        self._release(slot)
+                        continue
+                    self._entries.move_to_end(slot)
+                    self.hits += 1
+                    return payload
+            self.misses += 1
+            return None
+
+    def put(self, embedding: np.ndarray, payload: Any, tag: Hashable = None, generation: Optional[int] = None):
+        """Store a payload; pass the generation read before computing it so results
+        that straddle an invalidate() are dropped instead of cached as fresh"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_size, embedding.shape[0]), dtype=np.float32)
+            if not self._free:
+                oldest = next(iter(self._entries))
+                self._release(oldest)
+            slot = self._free.pop()
+            self._matrix[slot] = embedding
+            self._entries[slot] = (tag, payload, time.monotonic() + self.ttl, self.generation)
+
+    def invalidate(self):
+        """Drop every cached entry lazily by advancing the generation"""
+        with self._lock:
+            self.generation += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _release(self, slot: int):
+        del self._entries[slot]
+        # Zeroed rows never reach the similarity threshold
+        self._matrix[slot] = 0.0
+        self._free.append(slot)
+
+
+class ExactCache:
+    """LRU cache with a TTL for payloads that must only be reused for the exact same key"""
+
+    def __init__(self, ttl: float = 300.0, max_size: int = 2000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        # key -> (payload, expires_at), in LRU order
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, payload: Any):
+        with self._lock:
+            self._entries[key] = (payload, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
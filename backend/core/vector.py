@@ -1,49 +1,114 @@
 import os
+import random
+import time
+import functools
 import numpy as np
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Sequence
 from pinecone import Pinecone, ServerlessSpec
 from dotenv import load_dotenv
 
+from core.chunk_store import ChunkStore
+from core.embedding import EmbeddedBatch
+
 load_dotenv()
 
 
+@functools.lru_cache(maxsize=4)
+def _client(api_key: str) -> Pinecone:
+    """One Pinecone client per API key, shared by every VectorStore in the process"""
+    return Pinecone(api_key=api_key)
+
+
+@functools.lru_cache(maxsize=16)
+def _ensure_index(api_key: str, index_name: str, dimension: int, metric: str, cloud: str, region: str):
+    """Create the index if needed; the list_indexes round-trip runs once per process"""
+    pc = _client(api_key)
+    if index_name not in [idx.name for idx in pc.list_indexes()]:
+        pc.create_index(
+            name=index_name,
+            dimension=dimension,
+            metric=metric,
+            spec=ServerlessSpec(cloud=cloud, region=region)
+        )
+
+
+@functools.lru_cache(maxsize=16)
+def _index(api_key: str, index_name: str):
+    # A larger pool lets concurrent upsert batches reuse warm connections
+    return _client(api_key).Index(index_name, pool_threads=32)
+
+
 class VectorStore:
-    def __init__(self, index_name: str, dimension: int):
+    def __init__(self, index_name: str, dimension: int, upsert_workers: int = 8, fp16_payload: bool = False,
+                 metric: str = "dotproduct", chunk_store: Optional[ChunkStore] = None):
         self.index_name = index_name
+        self.upsert_workers = upsert_workers
+        # Round vectors to fp16 precision before upload: shorter JSON floats, negligible recall loss
+        self.fp16_payload = fp16_payload
+        # When set, chunk text lives here and Pinecone only stores vectors plus small metadata
+        self.chunk_store = chunk_store
         
         # Initialize Pinecone
-        pc = Pinecone(api_key=os.environ['PINECONE_API_KEY'])
-        
-        # Create index if it doesn't exist
-        if index_name not in [idx.name for idx in pc.list_indexes()]:
-            pc.create_index(
-                name=index_name,
-                dimension=dimension,
-                metric="cosine",
-                spec=ServerlessSpec(cloud='aws', region='us-east-1')
-            )
-        
-        self.index = pc.Index(index_name)
-
-    def upsert(self, embeddings: List[Dict[str, Any]], doc_id: str):
-        """Simple upsert with automatic ID generation"""
-        vectors = []
-        for i, item in enumerate(embeddings):
-            vector_id = f"{doc_id}_chunk_{i}"
-            metadata = item["metadata"].copy()
-            metadata["content"] = item["content"]  # Store content in metadata
-            
-            vectors.append((
-                vector_id,
-                item["embedding"].tolist(),
-                metadata
-            ))
-        
-        # Batch upsert
+        api_key = os.environ['PINECONE_API_KEY']
+
+        # Create index if it doesn't exist. Embeddings are unit-normalized, so a
+        # dot product equals cosine similarity without the per-candidate norms;
+        # existing cosine indexes keep working and return the same scores.
+        _ensure_index(api_key, index_name, dimension, metric, 'aws', 'us-east-1')
+
+        self.index = _index(api_key, index_name)
+
+    def upsert(self, embedded: EmbeddedBatch, doc_id: str, indices: Optional[Sequence[int]] = None):
+        """Simple upsert with automatic ID generation; indices give each row's chunk number for partial batches"""
+        # One bulk conversion of the whole matrix instead of one per row
+        matrix = embedded.embeddings
+        if self.fp16_payload:
+            matrix = matrix.astype(np.float16)
+        rows = matrix.astype(np.float32, copy=False).tolist()
+        ids = [f"{doc_id}_chunk_{indices[i] if indices is not None else i}" for i in range(len(rows))]
+        if self.chunk_store is not None:
+            # The vector ID is the reference back to the stored content
+            self.chunk_store.put_many(list(zip(ids, embedded.contents)))
+            vectors = list(zip(ids, rows, embedded.metadatas))
+        else:
+            vectors = [
+                (vector_id, row, {**metadata, "content": content})  # Store content in metadata
+                for vector_id, row, content, metadata in zip(ids, rows, embedded.contents, embedded.metadatas)
+            ]
+
+        # Batch upsert; batches are independent, so send them concurrently
         batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            self.index.upsert(batch)
+        batches = [vectors[i:i + batch_size] for i in range(0, len(vectors), batch_size)]
+        if len(batches) <= 1:
+            for batch in batches:
+                self._upsert_batch(batch)
+            return
+        with ThreadPoolExecutor(max_workers=min(self.upsert_workers, len(batches))) as executor:
+            list(executor.map(self._upsert_batch, batches))
+
+    def _upsert_batch(self, batch: List[tuple], max_attempts: int = 5):
+        """Upsert one batch, backing off with jitter when Pinecone rate-limits us"""
+        for attempt in range(max_attempts):
+            try:
+                return self.index.upsert(batch)
+            except Exception as e:
+                if getattr(e, "status", None) != 429 or attempt == max_attempts - 1:
+                    raise
+                time.sleep(min(8.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5))
+
+    def delete_document(self, doc_id: str, chunk_count: int):
+        """Remove every vector (and stored chunk) of a document with chunk_count chunks"""
+        ids = [f"{doc_id}_chunk_{i}" for i in range(chunk_count)]
+        # Pinecone accepts at most 1000 IDs per delete; IDs that were never written are ignored
+        for i in range(0, len(ids), 1000):
+            self.index.delete(ids=ids[i:i + 1000])
+        if self.chunk_store is not None:
+            self.chunk_store.delete_many(ids)
+
+    def warm_up(self):
+        """Open a pooled connection to the index before the first request needs it"""
+        self.index.describe_index_stats()
 
     def query(self, embedding: np.ndarray, top_k: int = 5):
         """Simple query returning matches"""
@@ -53,3 +118,9 @@ class VectorStore:
             include_metadata=True
         )
         return results.matches
+
+    def contents(self, matches) -> List[str]:
+        """Chunk text for each match, read from the chunk store when one is configured"""
+        stored = self.chunk_store.get_many([match.id for match in matches]) if self.chunk_store is not None else {}
+        # Vectors upserted before the chunk store was enabled still carry their content
+        return [stored.get(match.id) or (match.metadata or {}).get("content", "") for match in matches]
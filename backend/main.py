@@ -1,29 +1,49 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from contextlib import asynccontextmanager
 import tempfile
-import shutil
 import hashlib
+import secrets
+import codecs
 import time
 import os
-import requests
+import json
+import asyncio
+import logging
+import multiprocessing
+import itertools
+import uuid
+import httpx
+import aiofiles
+import orjson
 from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 # Import your simplified components
-from core.document_processor import DocumentProcessor
+from core.document_processor import DocumentProcessor, EmptyDocumentError
 from core.embedding import Embeddings
 from core.vector import VectorStore
+from core.chunk_store import ChunkStore
+from core.semantic_cache import ExactCache, QueryCache
 
 # Simple models
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 class QueryRequest(BaseModel):
     query: str
     top_k: int = 5
 
+class QueryResult(BaseModel):
+    content: str
+    filename: str
+    score: float
+
 class QueryResponse(BaseModel):
-    results: List[dict]
+    results: List[QueryResult]
     query: str
 
 class ChatRequest(BaseModel):
@@ -33,11 +53,59 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
 
+class ChatBatchRequest(BaseModel):
+    queries: List[str]
+    context: str
+
+class ChatBatchResponse(BaseModel):
+    # errors[i] explains why responses[i] is null
+    responses: List[Optional[str]]
+    errors: List[Optional[str]]
+
+# The root payload never changes, so serialize it once
+ROOT_JSON = orjson.dumps({"message": "Simple RAG API is running", "status": "ready"})
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+OPENROUTER_CHAT_PATH = "/chat/completions"
+
+ALLOWED_EXTENSIONS = frozenset({'.pdf', '.docx', '.txt', '.csv', '.html'})
+
+# Leading bytes of the binary formats; text formats have no signature
+MAGIC_BYTES = {'.pdf': b'%PDF', '.docx': b'PK\x03\x04'}
+TEXT_EXTENSIONS = frozenset({'.txt', '.csv', '.html'})
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "50")) << 20
+
+logger = logging.getLogger(__name__)
+
 # Global components
 processor = None
 embeddings = None
 vector_store = None
 
+# Search results and answers are only reused for the same normalized question:
+# near-identical embeddings ("Q3 revenue" vs "Q4 revenue") can still need different
+# results. Setting QUERY_CACHE_THRESHOLD lets /query also reuse results across
+# rewordings whose embeddings are at least that similar.
+QUERY_CACHE_THRESHOLD = float(threshold) if (threshold := os.getenv("QUERY_CACHE_THRESHOLD")) else None
+# In exact mode the normalized text is part of the tag, so similarity never decides a hit
+query_cache = QueryCache(threshold=QUERY_CACHE_THRESHOLD if QUERY_CACHE_THRESHOLD is not None else -1.0)
+chat_cache = ExactCache()
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a question, for exact cache keys"""
+    return " ".join(query.lower().split())
+
+def query_cache_tag(request: QueryRequest) -> tuple:
+    if QUERY_CACHE_THRESHOLD is not None:
+        return (request.top_k,)
+    return request.top_k, normalize_query(request.query)
+
+def new_cpu_pool() -> ProcessPoolExecutor:
+    # Workers start lazily, after torch's thread pools, SQLite connections and the
+    # event loop exist; forking that process can deadlock, so start them fresh
+    return ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global processor, embeddings, vector_store
@@ -45,18 +113,53 @@ async def lifespan(app: FastAPI):
     print("🚀 Initializing RAG system...")
     
     # Initialize components
-    processor = DocumentProcessor(chunk_size=800, overlap=100)
-    embeddings = Embeddings()
+    processor = DocumentProcessor(chunk_size=800, overlap=100, cache_dir=os.getenv("DOCUMENT_CACHE_DIR"))
+    embeddings = Embeddings(
+        backend=os.getenv("EMBEDDING_BACKEND", "torch"),
+        precision=os.getenv("EMBEDDING_PRECISION", "fp32"),
+        cache_dir=os.getenv("EMBEDDING_CACHE_DIR"),
+        compile_model=os.getenv("EMBEDDING_COMPILE", "").lower() in ("1", "true")
+    )
     vector_store = VectorStore(
         index_name=os.getenv("PINECONE_INDEX_NAME", "rag-simple"),
-        dimension=embeddings.dimension()
+        dimension=embeddings.dimension(),
+        fp16_payload=os.getenv("PINECONE_FP16_PAYLOAD", "").lower() in ("1", "true"),
+        chunk_store=ChunkStore(chunk_store_path) if (chunk_store_path := os.getenv("CHUNK_STORE_PATH")) else None
+    )
+    
+    # Pay for tokenizer/graph initialisation and the Pinecone TLS handshake now,
+    # not on the first user request
+    embeddings.warm_up()
+    vector_store.warm_up()
+    
+    # Document parsing is CPU-bound and holds the GIL, so it runs in worker processes
+    app.state.cpu_pool = new_cpu_pool()
+    
+    # Shared async HTTP client so LLM calls don't block the event loop; HTTP/2
+    # multiplexes concurrent completions over a few warm connections
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        base_url=OPENROUTER_BASE_URL,
+        timeout=30.0,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
     )
     
     print("✅ RAG system ready!")
     yield
     print("🛑 Shutting down...")
+    # Stop background uploads (their partial vectors are removed) and mark them failed
+    # rather than leaving them "queued" or "processing"
+    for task in list(upload_tasks):
+        task.cancel()
+    await asyncio.gather(*upload_tasks, return_exceptions=True)
+    for job in upload_jobs.values():
+        if job["state"] in ("queued", "processing"):
+            job.update(state="failed", error="Cancelled during shutdown")
+    await embeddings.aclose()
+    await app.state.http.aclose()
+    app.state.cpu_pool.shutdown()
 
-app = FastAPI(title="Simple RAG API", lifespan=lifespan)
+app = FastAPI(title="Simple RAG API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -66,85 +169,255 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def generate_doc_id(filename: str, content: str) -> str:
+async def embed_and_store(chunks: List[dict], doc_id: str, batch_size: int = 512):
+    """Embed chunks batch by batch, upserting each batch while the next one is encoded.
+
+    If anything fails, vectors already written for doc_id are deleted again so a
+    failed upload leaves nothing behind.
+    """
+    loop = asyncio.get_running_loop()
+
+    # Batch similar-length chunks together so less of each batch is padding;
+    # vector IDs keep each chunk's original position
+    order = sorted(range(len(chunks)), key=lambda i: len(chunks[i]["content"]))
+
+    # Own pool so a failure can wait for upserts that are already running before cleaning up
+    upsert_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="upsert")
+    upserts = []
+    try:
+        for start in range(0, len(chunks), batch_size):
+            indices = order[start:start + batch_size]
+            embedded = await embeddings.aembed_documents([chunks[i] for i in indices])
+            upserts.append(upsert_pool.submit(vector_store.upsert, embedded, doc_id, indices))
+        await asyncio.gather(*(asyncio.wrap_future(upsert) for upsert in upserts))
+    except BaseException:
+        for upsert in upserts:
+            upsert.cancel()
+        await loop.run_in_executor(None, upsert_pool.shutdown)
+        await loop.run_in_executor(None, vector_store.delete_document, doc_id, len(chunks))
+        raise
+    finally:
+        upsert_pool.shutdown(wait=False)
+
+BASE36_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+def to_base36(n: int) -> str:
+    digits = []
+    while True:
+        n, r = divmod(n, 36)
+        digits.append(BASE36_DIGITS[r])
+        if not n:
+            return "".join(reversed(digits))
+
+DOC_ID_SAMPLE = 4096
+
+def generate_doc_id(filename: str, path: str) -> str:
     """Generate unique document ID"""
-    content_hash = hashlib.md5(content.encode()).hexdigest()[:8]
-    timestamp = int(time.time())
+    # The hash is only a salt next to the timestamp, so a head/middle/tail sample of the
+    # raw file plus its size is enough; nothing is decoded or read in full
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        hasher = hashlib.blake2b(size.to_bytes(8, "little"), digest_size=4)
+        if size <= 3 * DOC_ID_SAMPLE:
+            hasher.update(f.read())
+        else:
+            for offset in (0, size // 2, size - DOC_ID_SAMPLE):
+                f.seek(offset)
+                hasher.update(f.read(DOC_ID_SAMPLE))
+    content_hash = hasher.hexdigest()
+    # ~1ms wall-clock resolution plus a random suffix, so uploads in the same millisecond
+    # don't collide; parse from the right, since the name itself may contain "_"
+    timestamp = to_base36(time.time_ns() >> 20)
     clean_name = Path(filename).stem
-    return f"{clean_name}_{content_hash}_{timestamp}"
+    return f"{clean_name}_{content_hash}_{timestamp}_{secrets.token_hex(2)}"
+
+def matches_file_type(head: bytes, extension: str) -> bool:
+    """Whether the first bytes of an upload look like its declared file type"""
+    if extension in MAGIC_BYTES:
+        return head.startswith(MAGIC_BYTES[extension])
+    if extension in TEXT_EXTENSIONS:
+        if b"\x00" in head:
+            return False
+        try:
+            # Not final: the sample may end partway through a multi-byte character
+            codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        except UnicodeDecodeError:
+            return False
+        return True
+    return False
+
+# Uploads with less text than this are rejected as empty or unreadable
+MIN_DOCUMENT_CHARS = 10
+
+def process_upload(doc_processor: DocumentProcessor, path: str, filename: str) -> Tuple[Optional[str], List[dict]]:
+    """Extract and chunk an uploaded file in a worker process; doc ID is None if there is (almost) no text"""
+    doc_id = generate_doc_id(filename, path)
+    try:
+        return doc_id, doc_processor.process_document(path, filename, min_chars=MIN_DOCUMENT_CHARS)
+    except EmptyDocumentError:
+        return None, []
 
 @app.get("/")
 async def root():
-    return {"message": "Simple RAG API is running", "status": "ready"}
+    return Response(ROOT_JSON, media_type="application/json")
 
-@app.post("/upload-document")
-async def upload_document(file: UploadFile = File(...)):
+async def save_upload(file: UploadFile) -> str:
+    """Validate an upload and write it to a temp file, returning its path"""
     # Check file type
-    allowed_types = {'.pdf', '.docx', '.txt', '.csv', '.html'}
-    if Path(file.filename).suffix.lower() not in allowed_types:
+    name = file.filename or ""
+    dot = name.rfind(".")
+    file_extension = name[dot:].lower() if dot >= 0 else ""
+    if file_extension not in ALLOWED_EXTENSIONS:
         raise HTTPException(400, "Unsupported file type")
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(413, "File too large")
     
-    # Save temp file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=Path(file.filename).suffix) as tmp:
-        shutil.copyfileobj(file.file, tmp)
-        tmp_path = tmp.name
+    # Reject renamed or corrupt files before copying them to disk
+    head = await file.read(1024)
+    await file.seek(0)
+    if not matches_file_type(head, file_extension):
+        raise HTTPException(400, "File content does not match its type")
     
+    # Save temp file without blocking the event loop, so other requests keep being served
+    fd, tmp_path = tempfile.mkstemp(suffix=file_extension)
+    os.close(fd)
     try:
-        # Extract text
-        text = processor.extract_text(tmp_path)
-        if len(text.strip()) < 10:
+        written = 0
+        async with aiofiles.open(tmp_path, "wb") as tmp:
+            while chunk := await file.read(1 << 20):
+                # The declared size may be missing, so enforce the cap on what is actually written
+                written += len(chunk)
+                if written > MAX_UPLOAD_BYTES:
+                    raise HTTPException(413, "File too large")
+                await tmp.write(chunk)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path
+
+async def ingest_file(tmp_path: str, filename: str) -> Tuple[str, int]:
+    """Parse, embed and index a saved upload, then delete it; returns the doc ID and chunk count"""
+    try:
+        # Extract text, generate document ID and split into chunks
+        loop = asyncio.get_running_loop()
+        pool = app.state.cpu_pool
+        try:
+            doc_id, chunks = await loop.run_in_executor(
+                pool, process_upload, processor, tmp_path, filename
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a huge PDF); later uploads get a fresh pool.
+            # Every upload in flight on the broken pool lands here, so only the first replaces it
+            if app.state.cpu_pool is pool:
+                app.state.cpu_pool = new_cpu_pool()
+                pool.shutdown(wait=False)
+            raise HTTPException(503, "Document processing failed, please retry")
+        if doc_id is None:
             raise HTTPException(400, "Document is empty or unreadable")
         
-        # Generate document ID
-        doc_id = generate_doc_id(file.filename, text)
-        
-        # Split into chunks
-        chunks = processor.split_text(text, file.filename)
-        if not chunks:
-            raise HTTPException(400, "No chunks created from document")
-        
-        # Generate embeddings
-        embedded_chunks = embeddings.embed_documents(chunks)
-        
-        # Store in vector database
-        vector_store.upsert(embedded_chunks, doc_id)
-        
-        return {
-            "message": f"Successfully uploaded {file.filename}",
-            "doc_id": doc_id,
-            "chunks": len(chunks)
-        }
+        # Generate embeddings and store in vector database
+        await embed_and_store(chunks, doc_id)
+
+        # Cached search results may no longer reflect the index
+        query_cache.invalidate()
+        return doc_id, len(chunks)
         
     finally:
-        os.unlink(tmp_path)
+        # Unlinking a large file can take a while on some filesystems
+        await asyncio.get_running_loop().run_in_executor(None, os.unlink, tmp_path)
+
+@app.post("/upload-document")
+async def upload_document(file: UploadFile = File(...)):
+    tmp_path = await save_upload(file)
+    doc_id, chunk_count = await ingest_file(tmp_path, file.filename)
+    return {
+        "message": f"Successfully uploaded {file.filename}",
+        "doc_id": doc_id,
+        "chunks": chunk_count
+    }
+
+# Status of background uploads by job ID; only the most recent finished jobs are kept
+upload_jobs: "OrderedDict[str, dict]" = OrderedDict()
+MAX_UPLOAD_JOBS = 1000
+# Strong references so running jobs aren't garbage-collected
+upload_tasks = set()
+
+async def run_upload_job(job: dict, tmp_path: str, filename: str):
+    job["state"] = "processing"
+    try:
+        job["doc_id"], job["chunks"] = await ingest_file(tmp_path, filename)
+        job["state"] = "done"
+    except HTTPException as e:
+        job.update(state="failed", error=e.detail)
+    except Exception:
+        logger.exception("Background upload of %s failed", filename)
+        job.update(state="failed", error="Processing failed")
+
+def evict_finished_jobs():
+    """Drop the oldest finished jobs beyond MAX_UPLOAD_JOBS; queued and running jobs are kept"""
+    excess = len(upload_jobs) - MAX_UPLOAD_JOBS
+    if excess <= 0:
+        return
+    finished = [job_id for job_id, job in upload_jobs.items() if job["state"] in ("done", "failed")]
+    for job_id in finished[:excess]:
+        del upload_jobs[job_id]
+
+@app.post("/upload-document-async", status_code=202)
+async def upload_document_async(file: UploadFile = File(...)):
+    """Accept an upload and index it in the background; poll /upload-status/{job_id} for the result"""
+    tmp_path = await save_upload(file)
+    job_id = uuid.uuid4().hex
+    job = upload_jobs[job_id] = {"state": "queued", "filename": file.filename}
+    evict_finished_jobs()
+
+    task = asyncio.create_task(run_upload_job(job, tmp_path, file.filename))
+    upload_tasks.add(task)
+    task.add_done_callback(upload_tasks.discard)
+    return {"job_id": job_id, "state": "queued"}
+
+@app.get("/upload-status/{job_id}")
+async def upload_status(job_id: str):
+    job = upload_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown upload job")
+    return {"job_id": job_id, **job}
 
 @app.post("/query", response_model=QueryResponse)
 async def query_documents(request: QueryRequest):
     # Generate query embedding
-    query_embedding = embeddings.embed_query(request.query)
+    query_embedding = await embeddings.aembed_query(request.query)
+
+    # Serve repeated queries from the cache
+    cache_tag = query_cache_tag(request)
+    cached = query_cache.get(query_embedding, tag=cache_tag)
+    if cached is not None:
+        return QueryResponse(results=cached, query=request.query)
     
-    # Search vector store
-    matches = vector_store.query(query_embedding, request.top_k)
+    # Uploads finishing during the search invalidate the cache; don't store stale results then
+    generation = query_cache.generation
     
-    # Format results
-    results = []
-    for match in matches:
-        if match.score > 0.2:  # Simple relevance threshold
-            results.append({
-                "content": match.metadata.get("content", ""),
-                "filename": match.metadata.get("filename", ""),
-                "score": float(match.score)
-            })
+    # Search vector store on a worker thread so concurrent queries overlap their round-trips
+    loop = asyncio.get_running_loop()
+    matches = await loop.run_in_executor(None, vector_store.query, query_embedding, request.top_k)
     
+    # Format results, with a simple relevance threshold; matches come back best-first,
+    # so everything after the first one below it is skipped
+    matches = list(itertools.takewhile(lambda match: match.score > 0.2, matches))
+    contents = await loop.run_in_executor(None, vector_store.contents, matches) if matches else []
+    results = [
+        QueryResult(
+            content=content,
+            filename=(match.metadata or {}).get("filename", ""),
+            score=float(match.score)
+        )
+        for match, content in zip(matches, contents)
+    ]
+    
+    query_cache.put(query_embedding, results, tag=cache_tag, generation=generation)
     return QueryResponse(results=results, query=request.query)
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat_with_documents(request: ChatRequest):
-    api_key = os.getenv("OPENROUTER_API_KEY")
-    if not api_key:
-        raise HTTPException(500, "OpenRouter API key not configured")
-    
-    # Simple chat completion
+def build_chat_request(api_key: str, request: ChatRequest) -> tuple:
+    """Headers and payload for an OpenRouter chat completion"""
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
@@ -165,19 +438,137 @@ async def chat_with_documents(request: ChatRequest):
         "max_tokens": 500,
         "temperature": 0.3
     }
+    return headers, payload
+
+def get_openrouter_key() -> str:
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if not api_key:
+        raise HTTPException(500, "OpenRouter API key not configured")
+    return api_key
+
+def chat_cache_key(request: ChatRequest) -> tuple:
+    """Normalized question plus a digest of the exact context"""
+    return normalize_query(request.query), hashlib.sha1(request.context.encode()).digest()
+
+async def complete_chat(api_key: str, request: ChatRequest) -> str:
+    """One chat completion, served from the cache when the same question was asked about the same context"""
+    cache_key = chat_cache_key(request)
+    cached = chat_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
-    response = requests.post(
-        "https://openrouter.ai/api/v1/chat/completions",
-        headers=headers,
-        json=payload,
-        timeout=30
-    )
+    # Simple chat completion
+    headers, payload = build_chat_request(api_key, request)
+    try:
+        response = await app.state.http.post(OPENROUTER_CHAT_PATH, headers=headers, json=payload)
+    except httpx.RequestError:  # includes timeouts
+        raise HTTPException(500, "Failed to get AI response")
     
     if response.status_code != 200:
         raise HTTPException(500, "Failed to get AI response")
     
     ai_response = response.json()["choices"][0]["message"]["content"]
-    return ChatResponse(response=ai_response)
+    chat_cache.put(cache_key, ai_response)
+    return ai_response
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat_with_documents(request: ChatRequest):
+    api_key = get_openrouter_key()
+    return ChatResponse(response=await complete_chat(api_key, request))
+
+MAX_BATCH_QUERIES = 32
+
+@app.post("/chat-batch", response_model=ChatBatchResponse)
+async def chat_batch(request: ChatBatchRequest):
+    """Answer several questions about the same context concurrently; failed answers are null"""
+    # Every question is a paid completion, so one request can only fan out so far
+    if not 1 <= len(request.queries) <= MAX_BATCH_QUERIES:
+        raise HTTPException(422, f"queries must contain between 1 and {MAX_BATCH_QUERIES} questions")
+    api_key = get_openrouter_key()
+    # Bound in-flight completions so a large batch doesn't trip provider rate limits
+    semaphore = asyncio.Semaphore(16)
+
+    async def answer(query: str) -> str:
+        async with semaphore:
+            return await complete_chat(api_key, ChatRequest(query=query, context=request.context))
+
+    answers = await asyncio.gather(*(answer(query) for query in request.queries), return_exceptions=True)
+    responses, errors = [], []
+    for query, result in zip(request.queries, answers):
+        if isinstance(result, HTTPException):
+            responses.append(None)
+            errors.append(result.detail)
+        elif isinstance(result, Exception):
+            logger.error("Batch chat question %r failed", query, exc_info=result)
+            responses.append(None)
+            errors.append("Failed to get AI response")
+        else:
+            responses.append(result)
+            errors.append(None)
+    return ChatBatchResponse(responses=responses, errors=errors)
+
+@app.post("/chat-stream")
+async def chat_stream(request: ChatRequest):
+    """Same as /chat, but forwards tokens as server-sent events while they are generated"""
+    api_key = get_openrouter_key()
+
+    cache_key = chat_cache_key(request)
+    cached = chat_cache.get(cache_key)
+
+    headers, payload = build_chat_request(api_key, request)
+    payload["stream"] = True
+
+    async def events():
+        # Each event's data is a JSON-encoded text delta; the stream ends with [DONE]
+        if cached is not None:
+            yield f"data: {json.dumps(cached)}\n\n"
+            yield "data: [DONE]\n\n"
+            return
+
+        parts = []
+        finished = False
+        try:
+            async with app.state.http.stream("POST", OPENROUTER_CHAT_PATH, headers=headers, json=payload) as response:
+                if response.status_code != 200:
+                    yield "event: error\ndata: Failed to get AI response\n\n"
+                    return
+                async for line in response.aiter_lines():
+                    # Skip keep-alive comments and blank separators
+                    if not line.startswith("data: "):
+                        continue
+                    data = line[len("data: "):]
+                    if data == "[DONE]":
+                        finished = True
+                        break
+                    try:
+                        chunk = json.loads(data)
+                        if "error" in chunk:
+                            raise ValueError(chunk["error"])
+                        # Some chunks (e.g. trailing usage) carry no choices
+                        choices = chunk.get("choices") or [{}]
+                        delta = (choices[0].get("delta") or {}).get("content")
+                    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                        # Mid-stream error frames ({"error": ...}) and malformed chunks
+                        yield "event: error\ndata: Failed to get AI response\n\n"
+                        return
+                    if delta:
+                        parts.append(delta)
+                        yield f"data: {json.dumps(delta)}\n\n"
+        except httpx.RequestError:
+            yield "event: error\ndata: Failed to get AI response\n\n"
+            return
+
+        if not finished:
+            yield "event: error\ndata: Failed to get AI response\n\n"
+            return
+
+        answer = "".join(parts)
+        # Only cache complete, non-empty answers
+        if answer:
+            chat_cache.put(cache_key, answer)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 @app.get("/health")
 async def health_check():
@@ -187,6 +578,11 @@ async def health_check():
             "processor": processor is not None,
             "embeddings": embeddings is not None,
             "vector_store": vector_store is not None
+        },
+        "cache": {
+            "embedding": embeddings.query_cache_size() if embeddings is not None else 0,
+            "query": query_cache.stats(),
+            "chat": chat_cache.stats()
         }
     }
 